@@ -2,6 +2,14 @@ import logging
 import os
 
 class Config:
+    LOG_LEVELS = {
+        "DEBUG": logging.DEBUG,
+        "INFO": logging.INFO,
+        "WARNING": logging.WARNING,
+        "ERROR": logging.ERROR,
+        "CRITICAL": logging.CRITICAL
+    }
+
     def __init__(self):
         # FleetUp API configuration
         self.account_id = os.getenv('FLEETUP_ACCOUNT_ID')
@@ -10,6 +18,7 @@ class Config:
         self.base_url = os.getenv('FLEETUP_BASE_URL')
 
         self.collection_interval = os.getenv('COLLECTION_INTERVAL')
+        self._collection_interval = int(self.collection_interval) if self.collection_interval else 300
 
         # Token management
         self.token = None
@@ -17,18 +26,12 @@ class Config:
 
         # Logging configuration
         self.log_level = os.getenv('LOG_LEVEL', 'INFO')
+        self._log_level = self.LOG_LEVELS.get(self.log_level, logging.INFO)
 
     def get_log_level(self):
         """Return log level"""
-        log_levels = {
-            "DEBUG": logging.DEBUG,
-            "INFO": logging.INFO,
-            "WARNING": logging.WARNING,
-            "ERROR": logging.ERROR,
-            "CRITICAL": logging.CRITICAL
-        }
-        return log_levels.get(self.log_level, logging.INFO)  
-    
+        return self._log_level
+
     def get_collection_interval(self):
         """Return collection interval"""
-        return int(self.collection_interval) if self.collection_interval else 300
\ No newline at end of file
+        return self._collection_interval
\ No newline at end of file
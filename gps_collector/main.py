@@ -1,15 +1,59 @@
+import atexit
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
+import ijson
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from datetime import date, datetime
 import time
 import logging
+import logging.handlers
 import os
 import csv
-from typing import Dict, List, Optional
+import io
+import operator
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from typing import Dict, Iterable, Iterator, Optional
 from config import Config
 
 class RequestLogger:
+    # Credentials that must never end up in log files: header values, query
+    # parameters, and bodies of endpoints whose response is itself a credential
+    REDACTED_HEADERS = {'authorization', 'token', 'x-api-key'}
+    REDACTED_PARAMS = {'secret'}
+    REDACTED_BODY_PATHS = ('/token',)
+
+    @staticmethod
+    def _redact(headers) -> Dict[str, str]:
+        """Copy headers, masking credential values"""
+        return {
+            name: '***' if name.lower() in RequestLogger.REDACTED_HEADERS else value
+            for name, value in headers.items()
+        }
+
+    @staticmethod
+    def _redact_url(url: str) -> str:
+        """Mask credential query parameters in a URL"""
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = urlencode([
+            (name, '***' if name.lower() in RequestLogger.REDACTED_PARAMS else value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        ], safe='*')
+        return urlunsplit(parts._replace(query=query))
+
+    @staticmethod
+    def _body_preview(request, response: requests.Response) -> str:
+        """Return the first 500 characters of the body, or a placeholder for credential responses"""
+        if urlsplit(request.url).path.endswith(RequestLogger.REDACTED_BODY_PATHS):
+            return '***'
+        # Decode only the preview instead of the whole body
+        return response.content[:500].decode('utf-8', errors='replace')
+
     @staticmethod
     def log_request_details(logger: logging.Logger, response: requests.Response, *args, **kwargs):
         """Log detailed request information when in DEBUG mode"""
@@ -17,24 +61,62 @@ class RequestLogger:
             request = response.request
             details = [
                 "\n=== HTTP REQUEST DETAILS ===",
-                f"URL: {request.url}",
+                f"URL: {RequestLogger._redact_url(request.url)}",
                 f"Method: {request.method}",
-                f"Headers: {dict(request.headers)}",
+                f"Headers: {RequestLogger._redact(request.headers)}",
                 f"Body: {request.body}",
                 "\n=== HTTP RESPONSE DETAILS ===",
                 f"Status: {response.status_code}",
-                f"Headers: {dict(response.headers)}",
-                f"Response Body: {response.text[:500]}...",  # Limit response body length
+                f"Headers: {RequestLogger._redact(response.headers)}",
+                f"Response Body: {RequestLogger._body_preview(request, response)}...",
                 "============================\n"
             ]
             logger.debug("\n".join(details))
 
+class LocationStream:
+    """Iterable of streamed location records that owns the underlying HTTP response"""
+    def __init__(self, response: requests.Response, records: Iterator[Dict]):
+        self._response = response
+        self._records = records
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self._records
+
+    def close(self):
+        """Release the connection, even if the records were never read"""
+        self._records.close()
+        self._response.close()
+
 class ApiClient:
+    # Refresh the token this many seconds before it actually expires
+    TOKEN_REFRESH_MARGIN = 60
+
     def __init__(self, config: Config, logger: logging.Logger):
         self.config = config
         self.logger = logger
+        self._token_deadline = 0.0  # time.monotonic() value after which the token must be refreshed
+        # Request pieces that stay the same across calls; only the token changes
+        self._url_locations = f"{config.base_url}gpsdata/device-last-location"
+        self._loc_headers = {
+            "x-api-key": config.api_key,
+            "token": None,
+            "Content-Type": "application/json"
+        }
+        self._loc_body = {"acctId": config.account_id}
         self.session = requests.Session()
-        if not hasattr(ApiClient, '_hook_added'):
+        # Retry transient failures with backoff on the pooled connection instead of
+        # losing the whole cycle; explicit pool sizes keep connections alive across cycles
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods={'GET', 'POST'}
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=10)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Only pay for the response hook when its DEBUG output can be emitted
+        if self.logger.isEnabledFor(logging.DEBUG) and not hasattr(ApiClient, '_hook_added'):
             self.session.hooks['response'].append(
                 lambda r, *args, **kwargs: RequestLogger.log_request_details(self.logger, r)
             )
@@ -50,44 +132,86 @@ class ApiClient:
             response = self.session.get(url, params=params, headers=headers, timeout=10) 
             response.raise_for_status()
             data = response.json()
-            
+
             self.config.token = data['token']
+            self._loc_headers["token"] = self.config.token
             self.config.token_expiry_time = datetime.fromtimestamp(data['expireTime'])
+            # Map the wall-clock expiry onto the monotonic clock, minus a safety margin
+            self._token_deadline = time.monotonic() + (data['expireTime'] - time.time()) - self.TOKEN_REFRESH_MARGIN
             self.logger.info("Successfully refreshed FleetUp token")
         except requests.RequestException as e:
-            self.logger.error(f"Token refresh failed: {str(e)}")
+            self.logger.error("Token refresh failed: %s", e)
             raise
 
     def _ensure_valid_token(self):
         """Validate and refresh token if needed"""
-        if not self.config.token or datetime.now() > self.config.token_expiry_time:
-            self.logger.info("Token expired or missing, initiating refresh")
+        if not self.config.token or time.monotonic() >= self._token_deadline:
+            self.logger.info("Token expired, expiring soon or missing, initiating refresh")
             self._refresh_token()
 
-    def get_locations(self) -> List[Dict]:
-        """Fetch device locations from API"""
-        self._ensure_valid_token()
-        url = f"{self.config.base_url}gpsdata/device-last-location"
-        headers = {
-            "x-api-key": self.config.api_key,
-            "token": self.config.token,
-            "Content-Type": "application/json"
-        }
-        body = {"acctId": self.config.account_id}
+    def _post_locations(self, stream: bool) -> requests.Response:
+        """POST the locations request, refreshing the token and retrying once on 401"""
+        url = self._url_locations
+        response = self.session.post(url, json=self._loc_body, headers=self._loc_headers, timeout=10, stream=stream)
+        if response.status_code == 401:
+            # Token was invalidated out-of-band; refresh and retry once
+            self.logger.info("Token rejected, refreshing and retrying once")
+            response.close()
+            self._refresh_token()
+            response = self.session.post(url, json=self._loc_body, headers=self._loc_headers, timeout=10, stream=stream)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        return response
 
+    def _iter_locations(self, response: requests.Response) -> Iterator[Dict]:
+        """Stream location records out of the response body one at a time"""
+        records = ijson.sendable_list()
+        parser = ijson.items_coro(records, 'data.item', use_float=True)
+        yielded = 0
         try:
-            response = self.session.post(url, json=body, headers=headers, timeout=10)  
-            response.raise_for_status()
-            return response.json().get('data', [])
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                parser.send(chunk)
+                yielded += len(records)
+                yield from records
+                del records[:]
+            parser.close()
+            yielded += len(records)
+            yield from records
+        except ijson.JSONError as e:
+            # ijson rejects NaN/Infinity, which the stdlib parser (used by response.json()) accepts.
+            # The body is not kept, so re-fetch it unstreamed; the endpoint returns one record per
+            # device in a stable order, so skip the records that were already yielded.
+            self.logger.warning("Streaming parse of locations failed (%s), re-fetching without streaming", e)
+            response.close()
+            yield from (self._post_locations(stream=False).json().get('data') or [])[yielded:]
+
+    def get_locations(self) -> LocationStream:
+        """Fetch device locations from API, streaming records as they are parsed"""
+        self._ensure_valid_token()
+        try:
+            response = self._post_locations(stream=True)
+            return LocationStream(response, self._iter_locations(response))
         except requests.RequestException as e:
-            self.logger.error(f"Failed to get locations: {str(e)}")
+            self.logger.error("Failed to get locations: %s", e)
             raise
 
 class CsvHandler:
+    # Large write buffer so a whole batch is staged in userspace and flushed at once
+    WRITE_BUFFER_SIZE = 1 << 20
+    # Rows formatted per write() call, so a streamed batch is never held in memory at once
+    WRITE_CHUNK_ROWS = 1000
+    RECORD_FIELDS = ('devId', 'lat', 'lng', 'speed', 'direction', 'rpm', 'fuelWear', 'idling')
+    _get_record_fields = operator.itemgetter(*RECORD_FIELDS)
+
     def __init__(self, base_dir: str, logger: logging.Logger):
         self.base_dir = base_dir
         self.logger = logger
+        self._fh = None  # long-lived append handle, reopened only on day rollover
+        self._header_ensured = False
+        atexit.register(self.close)
         self._ensure_directory()
+        self._current_day = date.today().toordinal()
         self.file_path = self._get_file_path()
 
     def _ensure_directory(self):
@@ -97,46 +221,98 @@ class CsvHandler:
 
     def _get_file_path(self) -> str:
         """Generate CSV file path with the current date."""
-        current_date = datetime.now().strftime('%Y%m%d')
+        current_date = date.fromordinal(self._current_day).strftime('%Y%m%d')
         return os.path.join(self.base_dir, f'gps_data_{current_date}.csv')
 
+    def _check_rollover(self):
+        """Switch to a new daily file when the date changes."""
+        # Integer day compare; the path is only rebuilt at the day boundary
+        today = date.today().toordinal()
+        if today != self._current_day:
+            self.close(sync=True)
+            self._current_day = today
+            self.file_path = self._get_file_path()
+            self._header_ensured = False
+
     def _ensure_header(self):
         """Create file with headers if not exists."""
-        if not os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, mode='w', newline='', encoding='utf-8') as file:
-                    writer = csv.writer(file)
-                    writer.writerow([
-                        'timestamp', 'device_id', 'latitude', 'longitude',
-                        'speed', 'direction', 'rpm', 'fuel_wear', 'idling'
-                    ])
-                self.logger.info(f"Created new CSV file at {self.file_path}")
-            except IOError as e:
-                self.logger.error(f"Failed to create CSV file: {str(e)}")
-                raise
-
-    def save_records(self, records: List[Dict]):
-        """Save multiple records to CSV."""
+        if self._header_ensured:
+            return
+        try:
+            # O_EXCL creates the file atomically; an existing file already has its header
+            fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow([
+                    'timestamp', 'device_id', 'latitude', 'longitude',
+                    'speed', 'direction', 'rpm', 'fuel_wear', 'idling'
+                ])
+            self.logger.info("Created new CSV file at %s", self.file_path)
+        except FileExistsError:
+            pass
+        except IOError as e:
+            self.logger.error("Failed to create CSV file: %s", e)
+            raise
+        self._header_ensured = True
+
+    def _get_handle(self):
+        """Return the cached append-mode file handle, opening it on first use."""
+        if self._fh is None:
+            self._fh = open(self.file_path, mode='a', newline='', encoding='utf-8',
+                            buffering=self.WRITE_BUFFER_SIZE)
+        return self._fh
+
+    @classmethod
+    def _record_values(cls, record: Dict) -> tuple:
+        """Extract the CSV fields of a record, tolerating missing keys."""
+        try:
+            return cls._get_record_fields(record)
+        except KeyError:
+            return (record.get('devId', 'N/A'),) + tuple(record.get(key) for key in cls.RECORD_FIELDS[1:])
+
+    @staticmethod
+    def _format_row(row) -> str:
+        """Format a row as a CSV line, falling back to csv.writer when quoting is needed."""
+        line = ','.join('' if value is None else str(value) for value in row)
+        if line.count(',') != len(row) - 1 or '"' in line or '\n' in line or '\r' in line:
+            # Keep the default '\r\n' terminator: csv.writer only quotes embedded newlines
+            # that appear in the terminator, so strip it off afterwards instead
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(row)
+            return buffer.getvalue()[:-2]
+        return line
+
+    def close(self, sync: bool = False):
+        """Flush and close the cached file handle, optionally fsyncing it to disk."""
+        if self._fh is not None:
+            if sync:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+
+    def save_records(self, records: Iterable[Dict]):
+        """Save multiple records to CSV. Records may be a lazily-consumed iterator."""
         # Ensure the header exists before saving records
+        self._check_rollover()
         self._ensure_header()
+        # All records come from one API call, so they share one timestamp
+        timestamp = datetime.now().isoformat(timespec='seconds')
         try:
-            with open(self.file_path, mode='a', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                for record in records:
-                    writer.writerow([
-                        datetime.now().isoformat(),
-                        record.get('devId', 'N/A'),
-                        record.get('lat'),
-                        record.get('lng'),
-                        record.get('speed'),
-                        record.get('direction'),
-                        record.get('rpm'),
-                        record.get('fuelWear'),
-                        record.get('idling')
-                    ])
-            self.logger.info(f"Successfully saved {len(records)} records.")
+            file = self._get_handle()
+            rows = (self._format_row((timestamp,) + self._record_values(record)) for record in records)
+            count = 0
+            while True:
+                lines = list(islice(rows, self.WRITE_CHUNK_ROWS))
+                if not lines:
+                    break
+                # Same line terminator as csv.writer, which wrote the header
+                file.write('\r\n'.join(lines) + '\r\n')
+                count += len(lines)
+            file.flush()
+            self.logger.info("Successfully saved %d records.", count)
         except IOError as e:
-            self.logger.error(f"CSV write failed: {str(e)}")
+            self.logger.error("CSV write failed: %s", e)
             raise
 
 class GPSDataCollector:
@@ -145,34 +321,54 @@ class GPSDataCollector:
         self.api_client = api_client
         self.csv_handler = csv_handler
         self.logger = logger
+        # Single worker keeps batches in order while disk writes overlap the next fetch
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-writer')
+
+    def _on_write_done(self, future: Future):
+        """Report failures of a background CSV write"""
+        error = future.exception()
+        if error is not None:
+            self.logger.error("Saving collected data failed: %s", error, exc_info=error)
+
+    def _save(self, locations: LocationStream):
+        """Write a batch to CSV and release its HTTP response, whether or not the write succeeds"""
+        try:
+            self.csv_handler.save_records(locations)
+        finally:
+            locations.close()
 
     def collect_data(self):
         """Execute data collection cycle"""
         try:
             self.logger.info("Starting data collection cycle")
             locations = self.api_client.get_locations()
-            self.csv_handler.save_records(locations)
-            self.logger.debug(f"Collected {len(locations)} location(s). Sample data: {locations[:2]}...")  # Log count and sample data
+            # The writer thread consumes the response stream while parsing it
+            self._writer.submit(self._save, locations).add_done_callback(self._on_write_done)
         except Exception as e:
-            self.logger.error(f"Data collection cycle failed: {str(e)}", exc_info=True)
+            self.logger.error("Data collection cycle failed: %s", e, exc_info=True)
             raise
 
     def run_periodically(self):
         """Run collection task on schedule."""
         self.logger.debug("Running periodically")
-        self.logger.debug(f"Collection interval: {self.config.get_collection_interval()}")
         interval = self.config.get_collection_interval()  # Default to 300 seconds if not specified
-        self.logger.info(f"Starting periodic collection with {interval} second interval.")
-        next_run_time = time.time()
+        self.logger.debug("Collection interval: %s", interval)
+        self.logger.info("Starting periodic collection with %s second interval.", interval)
+        # Absolute monotonic deadlines keep a fixed cadence and ignore wall-clock jumps
+        next_run_time = time.monotonic()
         while True:
             try:
                 self.collect_data()
             except Exception as e:
-                self.logger.critical(f"Critical failure in collection cycle: {str(e)}")
-            
+                self.logger.critical("Critical failure in collection cycle: %s", e)
+
             next_run_time += interval
-            sleep_time = max(0, next_run_time - time.time())
-            time.sleep(sleep_time)
+            sleep_time = next_run_time - time.monotonic()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            else:
+                # Fell behind schedule; resync instead of running back-to-back cycles
+                next_run_time = time.monotonic()
 
 class ApplicationFactory:
     @staticmethod
@@ -207,16 +403,21 @@ class ApplicationFactory:
         with log_lock:
             if not logger.handlers:
                 script_dir = os.path.dirname(os.path.abspath(__file__))
-                
-                # Get the current date to create a daily log file
-                current_date = datetime.now().strftime('%Y%m%d')
                 log_dir = os.path.abspath(os.path.join(script_dir, '../logs'))
                 os.makedirs(log_dir, exist_ok=True)
-                log_file = os.path.join(log_dir, f'qanalytics_integration_{current_date}.log')
+                log_file = os.path.join(log_dir, 'qanalytics_integration.log')
 
-                handler = logging.FileHandler(log_file, encoding='utf-8')
+                # Roll over to a new log file at midnight without reopening handlers
+                file_handler = logging.handlers.TimedRotatingFileHandler(
+                    log_file, when='midnight', backupCount=30, encoding='utf-8', utc=True
+                )
                 formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-                handler.setFormatter(formatter)
+                file_handler.setFormatter(formatter)
+
+                # Buffer DEBUG bursts; INFO and above are flushed immediately
+                handler = logging.handlers.MemoryHandler(
+                    capacity=128, flushLevel=logging.INFO, target=file_handler
+                )
                 logger.addHandler(handler)
 
         return logger
@@ -0,0 +1,38 @@
+import csv
+import io
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gps_collector'))
+
+from main import CsvHandler
+
+
+def _csv_writer_line(row) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+def test_format_row_matches_csv_writer_for_values_needing_quotes():
+    for dev_id in ['plain', 'has,comma', 'has"quote', 'has\nnewline', 'has\rreturn', 'a,"b"\r\nc']:
+        row = ('2024-01-01T00:00:00', dev_id, 1.25, None, 0, True, 3, 0.5, False)
+        assert CsvHandler._format_row(row) + '\r\n' == _csv_writer_line(row)
+
+
+def test_save_records_round_trips_values_needing_quotes(tmp_path):
+    handler = CsvHandler(str(tmp_path), logging.getLogger('test'))
+    records = [
+        {'devId': 'has,comma', 'lat': 1.25},
+        {'devId': 'has"quote', 'lat': 2.5},
+        {'devId': 'bad\nid', 'lat': 3.75},
+        {'devId': 'bad\rid'},
+    ]
+    handler.save_records(records)
+    handler.close()
+
+    with open(handler.file_path, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    assert [row[1] for row in rows[1:]] == [record['devId'] for record in records]
+    assert [row[2] for row in rows[1:]] == ['1.25', '2.5', '3.75', '']